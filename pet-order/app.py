@@ -1,19 +1,75 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from cachetools import TTLCache
 from flask import Flask, request, jsonify
+from flask.json.provider import JSONProvider
 from pymongo import MongoClient
+import orjson
 import os
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import random
+import threading
 import uuid
 
+from gunicorn_conf import threads as REQUEST_THREADS
+
+
+class ORJSONProvider(JSONProvider):
+    """Flask JSON provider backed by orjson for jsonify and get_json."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 
 # -----------------------
 # MongoDB
 # -----------------------
 MONGO_URL = os.environ.get("MONGO_URL", "mongodb://mongodb:27017")
-client = MongoClient(MONGO_URL)
-db = client.petorder
-transactions = db.transactions
+
+
+def init_mongo():
+    """
+    (Re)create the MongoClient and collection handles.
+    Called at import and again in each gunicorn worker after fork, since a
+    MongoClient must not be shared across fork. connect=False means no
+    connection is opened until the first operation, so the preloading
+    gunicorn master never talks to MongoDB itself.
+    """
+    global client, db, transactions
+    client = MongoClient(
+        MONGO_URL,
+        maxPoolSize=20,
+        minPoolSize=2,
+        waitQueueTimeoutMS=2000,
+        connect=False,
+    )
+    db = client.petorder
+    transactions = db.transactions
+
+
+init_mongo()
+
+
+def ensure_indexes():
+    """Index the fields /transactions filters on; safe to run repeatedly."""
+    try:
+        transactions.create_index("purchase-id", unique=True)
+        transactions.create_index([("purchaser", 1), ("pet-type", 1)])
+        transactions.create_index("store")
+    except Exception as e:
+        print("Could not create transaction indexes:", e, flush=True)
+
+
+def start_index_build():
+    # in the background, so startup doesn't block while MongoDB comes up
+    threading.Thread(target=ensure_indexes, daemon=True).start()
 
 # -----------------------
 # Constants
@@ -24,6 +80,37 @@ OWNER_VALUE = "LovesPetsL2M3n4"
 PETSTORE1 = "http://petstore1:5001"
 PETSTORE2 = "http://petstore2:5001"
 
+# -----------------------
+# Outbound HTTP (pooled keep-alive connections to the petstores)
+# -----------------------
+def init_session():
+    """(Re)create the pooled Session; also called per gunicorn worker."""
+    global session
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=32,
+        # only retry idempotent reads: a retried DELETE whose first response
+        # was lost would get 404 for a pet that was in fact removed
+        max_retries=Retry(
+            total=2, backoff_factor=0.1, allowed_methods=frozenset({"GET", "HEAD"})
+        ),
+    )
+    session.mount("http://", adapter)
+    session.headers["Connection"] = "keep-alive"
+
+
+init_session()
+
+# worker pool for querying both stores at the same time; sized so every
+# gunicorn request thread can query both stores without queueing behind
+# other purchases
+executor = ThreadPoolExecutor(max_workers=REQUEST_THREADS * 2)
+
+# (store_url, lowercase type) -> pet-type id; short TTL tolerates deletions
+pet_type_id_cache = TTLCache(maxsize=256, ttl=30)
+pet_type_id_cache_lock = threading.Lock()
+
 # -----------------------
 # Helpers
 # -----------------------
@@ -31,6 +118,11 @@ def json_error(msg, code):
     return jsonify({"error": msg}), code
 
 
+def ojson(obj, code=200):
+    """Serialize straight to bytes with orjson, skipping jsonify."""
+    return orjson.dumps(obj), code, {"Content-Type": "application/json"}
+
+
 def require_json():
     if not request.is_json:
         return json_error("Expected application/json media type", 415)
@@ -38,28 +130,58 @@ def require_json():
 
 
 def get_pet_type_id(store_url, pet_type):
-    r = requests.get(f"{store_url}/pet-types")
+    key = (store_url, pet_type.lower())
+    with pet_type_id_cache_lock:
+        pet_type_id = pet_type_id_cache.get(key)
+    if pet_type_id:
+        return pet_type_id
+
+    r = session.get(f"{store_url}/pet-types")
     if r.status_code != 200:
         return None
 
-    for pt in r.json():
-        if pt["type"].lower() == pet_type.lower():
-            return pt["id"]
-    return None
+    types = {pt["type"].lower(): pt["id"] for pt in r.json()}
+    with pet_type_id_cache_lock:
+        for type_lower, type_id in types.items():
+            pet_type_id_cache[(store_url, type_lower)] = type_id
+    return types.get(key[1])
 
 
 def get_pets(store_url, pet_type_id):
-    r = requests.get(f"{store_url}/pet-types/{pet_type_id}/pets")
+    r = session.get(f"{store_url}/pet-types/{pet_type_id}/pets")
     if r.status_code != 200:
         return []
     return r.json()
 
 
+def get_pet(store_url, pet_type_id, pet_name):
+    """Fetch a single pet by name (case-insensitive), or None if missing."""
+    r = session.get(f"{store_url}/pet-types/{pet_type_id}/pets/{pet_name}")
+    if r.status_code != 200:
+        return None
+    return r.json()
+
+
 def delete_pet(store_url, pet_type_id, pet_name):
-    return requests.delete(
+    return session.delete(
         f"{store_url}/pet-types/{pet_type_id}/pets/{pet_name}"
     ).status_code
 
+
+def lookup_store(store_url, pet_type, pet_name=None):
+    """
+    Return (pet_type_id, pets) for this store, or (None, []) if missing.
+    When pet_name is given, pets holds just that pet (if it exists).
+    """
+    pet_type_id = get_pet_type_id(store_url, pet_type)
+    if not pet_type_id:
+        return None, []
+
+    if pet_name:
+        pet = get_pet(store_url, pet_type_id, pet_name)
+        return pet_type_id, [pet] if pet else []
+    return pet_type_id, get_pets(store_url, pet_type_id)
+
 # -----------------------
 # Routes
 # -----------------------
@@ -97,28 +219,36 @@ def create_purchase():
     else:
         stores_to_check = [(1, PETSTORE1), (2, PETSTORE2)]
 
-    chosen = None
+    results = []
+    if len(stores_to_check) == 1:
+        # nothing to overlap with, so query the single store inline
+        store_id, store_url = stores_to_check[0]
+        pet_type_id, pets = lookup_store(store_url, pet_type, pet_name)
+        results.append((store_id, store_url, pet_type_id, pets))
+    else:
+        # query all candidate stores concurrently
+        futures = {
+            executor.submit(lookup_store, store_url, pet_type, pet_name): (store_id, store_url)
+            for store_id, store_url in stores_to_check
+        }
+        for fut in as_completed(futures):
+            store_id, store_url = futures[fut]
+            pet_type_id, pets = fut.result()
+            results.append((store_id, store_url, pet_type_id, pets))
+
+    # keep store priority: store 1 before store 2
+    results.sort(key=lambda r: r[0])
 
-    for store_id, store_url in stores_to_check:
-        pet_type_id = get_pet_type_id(store_url, pet_type)
-        if not pet_type_id:
-            continue
+    chosen = None
 
-        pets = get_pets(store_url, pet_type_id)
-        if not pets:
+    for store_id, store_url, pet_type_id, pets in results:
+        if not pet_type_id or not pets:
             continue
 
-        if pet_name:
-            for p in pets:
-                if p["name"].lower() == pet_name.lower():
-                    chosen = (store_id, store_url, pet_type_id, p["name"])
-                    break
-        else:
-            p = random.choice(pets)
-            chosen = (store_id, store_url, pet_type_id, p["name"])
-
-        if chosen:
-            break
+        # a named pet was already looked up directly; otherwise pick any
+        p = pets[0] if pet_name else random.choice(pets)
+        chosen = (store_id, store_url, pet_type_id, p["name"])
+        break
 
     if not chosen:
         return json_error("No pet of this type is available", 400)
@@ -160,13 +290,20 @@ def list_transactions():
             query[k] = v
 
     result = list(transactions.find(query, {"_id": 0}))
-    return jsonify(result), 200
+    return ojson(result)
 
 
 @app.route("/kill", methods=["GET"])
 def kill():
+    # under gunicorn a worker exiting with 1 is just respawned; exit code 3
+    # (WORKER_BOOT_ERROR) makes the master halt non-zero instead, so the
+    # container still stops and restart-on-failure applies
+    if request.environ.get("SERVER_SOFTWARE", "").startswith("gunicorn"):
+        os._exit(3)
     os._exit(1)
     
+# dev fallback; the container runs gunicorn (see gunicorn_conf.py)
 if __name__ == "__main__":
+    start_index_build()
     port = int(os.environ.get("PORT", 5001))
     app.run(host="0.0.0.0", port=port)
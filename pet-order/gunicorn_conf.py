@@ -0,0 +1,27 @@
+# gunicorn_conf.py
+import os
+
+# -----------------------
+# Server
+# -----------------------
+bind = f"0.0.0.0:{os.environ.get('PORT', 5001)}"
+
+# threaded workers: routes mostly wait on the petstores and MongoDB
+worker_class = "gthread"
+workers = 2
+threads = 16
+keepalive = 5
+
+# import the app once in the master so workers share it copy-on-write
+preload_app = True
+
+
+def post_worker_init(worker):
+    # give each worker its own MongoClient and HTTP session after fork;
+    # the master never connects to MongoDB, so indexes are built from here
+    # (create_index is a no-op once an index exists)
+    import app
+
+    app.init_mongo()
+    app.init_session()
+    app.start_index_build()
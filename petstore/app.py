@@ -1,26 +1,45 @@
 # app.py
 from flask import Flask, request, jsonify, send_from_directory
+from flask.json.provider import JSONProvider
+import hashlib
+import orjson
 import os
-import requests
+import shutil
+import tempfile
 
 from models import (
     pet_types,
     pets_by_type,
+    pet_type_lower,
     generate_pet_type_id,
     pet_type_exists_by_name,
     register_pet_type,
     remove_pet_type,
     get_pets_for_type,
+    lookup_pet,
     add_pet,
     delete_pet,
     pet_to_json,
+    pet_type_to_json,
+    picture_in_use,
     parse_date,
-    compare_dates,
     ensure_pictures_folder,
 )
-from ninja_client import fetch_pet_type_data, NinjaApiError, NinjaNotFound
+from ninja_client import fetch_pet_type_data, NinjaApiError, NinjaNotFound, session
+
+
+class ORJSONProvider(JSONProvider):
+    """Flask JSON provider backed by orjson for jsonify and get_json."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 
 ensure_pictures_folder()
 
@@ -32,6 +51,11 @@ def json_error(message, status):
     return jsonify({"error": message}), status
 
 
+def ojson(obj, status=200):
+    """Serialize straight to bytes with orjson, skipping jsonify."""
+    return orjson.dumps(obj), status, {"Content-Type": "application/json"}
+
+
 def server_error_from_ninja(status_code):
     return jsonify({"server error": f"API response code {status_code}"}), 500
 
@@ -82,12 +106,11 @@ def create_pet_type():
         "genus": info["genus"],
         "attributes": info["attributes"],
         "lifespan": info["lifespan"],
-        "pets": [],
     }
 
     register_pet_type(pet_type_obj)
 
-    return jsonify(pet_type_obj), 201
+    return jsonify(pet_type_to_json(pet_type_obj)), 201
 
 
 @app.route("/pet-types", methods=["GET"])
@@ -111,9 +134,11 @@ def list_pet_types():
                 return json_error("Malformed data", 400)
             result = [pt for pt in result if pt["lifespan"] == value_int]
         else:
+            # a pet-type deleted since the snapshot has no entry; skip it
+            value_lower = value.lower()
             result = [
                 pt for pt in result
-                if str(pt[field]).lower() == value.lower()
+                if pet_type_lower.get(pt["id"], {}).get(field) == value_lower
             ]
 
     # hasAttribute=<attr>
@@ -122,10 +147,10 @@ def list_pet_types():
         attr_lower = has_attr.lower()
         result = [
             pt for pt in result
-            if any(a.lower() == attr_lower for a in pt["attributes"])
+            if attr_lower in pet_type_lower.get(pt["id"], {}).get("attributes_lower", ())
         ]
 
-    return jsonify(result), 200
+    return ojson([pet_type_to_json(pt) for pt in result])
 
 
 # -----------------------
@@ -137,7 +162,7 @@ def get_pet_type(pet_type_id):
     pt = pet_types.get(pet_type_id)
     if not pt:
         return json_error("Not found", 404)
-    return jsonify(pt), 200
+    return jsonify(pet_type_to_json(pt)), 200
 
 
 @app.route("/pet-types/<pet_type_id>", methods=["DELETE"])
@@ -146,7 +171,7 @@ def delete_pet_type(pet_type_id):
     if not pt:
         return json_error("Not found", 404)
 
-    if pt["pets"]:
+    if get_pets_for_type(pet_type_id):
         # cannot delete if there are pets
         return json_error("Malformed data", 400)
 
@@ -167,25 +192,49 @@ def put_pet_type_not_allowed(pet_type_id):
 
 def _download_picture(picture_url):
     """Download picture and return file name, or raise for errors."""
-    resp = requests.get(picture_url, stream=True)
-    if resp.status_code != 200:
-        # simulate internal server error for unexpected codes
-        raise NinjaApiError(resp.status_code)
-
-    # guess extension from content-type
-    content_type = resp.headers.get("Content-Type", "")
-    ext = ".jpg"
-    if "png" in content_type.lower():
-        ext = ".png"
-
+    # stable name per URL, so a picture already on disk is not fetched again
     ensure_pictures_folder()
-    file_name = f"pet_{abs(hash(picture_url))}{ext}"
-    path = os.path.join("pictures", file_name)
-
-    with open(path, "wb") as f:
-        for chunk in resp.iter_content(8192):
-            if chunk:
-                f.write(chunk)
+    base_name = f"pet_{hashlib.blake2b(picture_url.encode(), digest_size=8).hexdigest()}"
+    for ext in (".jpg", ".png"):
+        if os.path.exists(os.path.join("pictures", base_name + ext)):
+            return base_name + ext
+
+    # images are already compressed, so don't ask for gzip
+    resp = session.get(
+        picture_url, stream=True, headers={"Accept-Encoding": "identity"}
+    )
+    # closing the response releases the pooled connection on every path
+    with resp:
+        if resp.status_code != 200:
+            # simulate internal server error for unexpected codes
+            raise NinjaApiError(resp.status_code)
+
+        # guess extension from content-type
+        content_type = resp.headers.get("Content-Type", "")
+        ext = ".jpg"
+        if "png" in content_type.lower():
+            ext = ".png"
+
+        file_name = f"{base_name}{ext}"
+        path = os.path.join("pictures", file_name)
+
+        # copy straight from the socket in 64 KiB blocks into a temp file,
+        # and only move it into place once complete, so a failed download
+        # never leaves a truncated picture under its final name
+        resp.raw.decode_content = True
+        fd, tmp_path = tempfile.mkstemp(dir="pictures", suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                shutil.copyfileobj(resp.raw, f, length=65536)
+            # mkstemp creates 0600; give the picture the usual 0644
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
 
     return file_name
 
@@ -234,8 +283,12 @@ def _build_or_update_pet(pet_type_id, data, existing_pet=None):
         file_name = _download_picture(picture_url)
         picture = file_name
 
-    # delete old file if changed
-    if old_picture_file and old_picture_file != "NA":
+    # delete old file if changed and no other pet shares it
+    if (
+        old_picture_file
+        and old_picture_file != "NA"
+        and not picture_in_use(old_picture_file, ignore=existing_pet)
+    ):
         try:
             os.remove(os.path.join("pictures", old_picture_file))
         except OSError:
@@ -244,6 +297,8 @@ def _build_or_update_pet(pet_type_id, data, existing_pet=None):
     internal = {
         "name": name,
         "birthdate": birthdate,
+        # parsed once here so list_pets can compare dates without strptime
+        "birthdate_parsed": parse_date(birthdate) if birthdate != "NA" else None,
         "picture": picture,
         "picture_url": picture_url,
     }
@@ -281,33 +336,31 @@ def list_pets(pet_type_id):
         return json_error("Not found", 404)
 
     pets_map = get_pets_for_type(pet_type_id)
-    pets_list = [pet_to_json(p) for p in pets_map.values()]
+    pets_list = list(pets_map.values())
 
     # date filters: birthdateGT, birthdateLT
     gt = request.args.get("birthdateGT")
     lt = request.args.get("birthdateLT")
 
-    # validate dates if present
+    # validate and parse dates once, if present
     try:
-        if gt:
-            parse_date(gt)
-        if lt:
-            parse_date(lt)
+        gt_date = parse_date(gt) if gt else None
+        lt_date = parse_date(lt) if lt else None
     except Exception:
         return json_error("Malformed data", 400)
 
-    if gt:
+    if gt_date:
         pets_list = [
             p for p in pets_list
-            if p["birthdate"] != "NA" and compare_dates(p["birthdate"], gt) > 0
+            if p["birthdate_parsed"] is not None and p["birthdate_parsed"] > gt_date
         ]
-    if lt:
+    if lt_date:
         pets_list = [
             p for p in pets_list
-            if p["birthdate"] != "NA" and compare_dates(p["birthdate"], lt) < 0
+            if p["birthdate_parsed"] is not None and p["birthdate_parsed"] < lt_date
         ]
 
-    return jsonify(pets_list), 200
+    return ojson([pet_to_json(p) for p in pets_list])
 
 
 # -----------------------
@@ -319,8 +372,7 @@ def get_pet(pet_type_id, name):
     if pet_type_id not in pet_types:
         return json_error("Not found", 404)
 
-    pets_map = get_pets_for_type(pet_type_id)
-    pet = pets_map.get(name.lower())
+    pet = lookup_pet(pet_type_id, name)
     if not pet:
         return json_error("Not found", 404)
 
@@ -336,8 +388,8 @@ def delete_pet_route(pet_type_id, name):
     if not pet:
         return json_error("Not found", 404)
 
-    # delete picture file if exists
-    if pet["picture"] != "NA":
+    # delete picture file if exists and no other pet shares it
+    if pet["picture"] != "NA" and not picture_in_use(pet["picture"]):
         try:
             os.remove(os.path.join("pictures", pet["picture"]))
         except OSError:
@@ -360,8 +412,7 @@ def update_pet(pet_type_id, name):
         return json_error("Malformed data", 400)
 
     # load existing pet
-    pets_map = get_pets_for_type(pet_type_id)
-    existing = pets_map.get(name.lower())
+    existing = lookup_pet(pet_type_id, name)
     if not existing:
         return json_error("Not found", 404)
 
@@ -396,6 +447,7 @@ def get_picture(file_name):
 # -----------------------
 
 if __name__ == "__main__":
+    # dev fallback; the container runs gunicorn (see gunicorn_conf.py)
     # listen on 0.0.0.0:5001 as required
     port = int(os.environ.get("PORT", 5001))
     app.run(host="0.0.0.0", port=port)
@@ -0,0 +1,14 @@
+# gunicorn_conf.py
+import os
+
+# -----------------------
+# Server
+# -----------------------
+bind = f"0.0.0.0:{os.environ.get('PORT', 5001)}"
+
+# pet-types and pets live in process memory (models.py), so keep a single
+# worker process and get concurrency from threads instead
+worker_class = "gthread"
+workers = 1
+threads = 16
+keepalive = 5
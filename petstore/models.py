@@ -2,29 +2,39 @@
 import datetime
 import os
 import string
+import threading
 
 # -----------------------
 # In-memory "database"
 # -----------------------
 
-# pet_types: id (str) -> pet-type JSON dict
+# pet_types: id (str) -> pet-type JSON dict (without "pets"; that array is
+# derived from pets_by_type by pet_type_to_json)
 pet_types = {}
 
 # pets_by_type: pet_type_id (str) -> { pet_name_lower: pet_internal_dict }
-# internal pet dict has keys: name, birthdate, picture, picture_url
+# internal pet dict has keys: name, birthdate, birthdate_parsed, picture, picture_url
 pets_by_type = {}
 
 # map from lowercase type name to id, to prevent duplicates
 type_name_to_id = {}
 
+# pet_type_lower: id (str) -> lowercased copies of the filterable fields,
+# kept beside pet_types so GET /pet-types filters don't re-lower per request
+# keys: id, type, family, genus, attributes_lower (frozenset)
+pet_type_lower = {}
+
 # simple incremental id generator for pet-types
 _next_pet_type_id = 1
+# requests are served from several threads, so guard the counter
+_pet_type_id_lock = threading.Lock()
 
 
 def generate_pet_type_id():
     global _next_pet_type_id
-    pet_id = str(_next_pet_type_id)
-    _next_pet_type_id += 1
+    with _pet_type_id_lock:
+        pet_id = str(_next_pet_type_id)
+        _next_pet_type_id += 1
     return pet_id
 
 
@@ -40,20 +50,14 @@ def parse_date(date_str):
     return datetime.datetime.strptime(date_str, DATE_FORMAT).date()
 
 
-def compare_dates(d1_str, d2_str):
-    """
-    Compare two DD-MM-YYYY strings.
-    Returns negative if d1<d2, 0 if equal, positive if d1>d2.
-    """
-    d1 = parse_date(d1_str)
-    d2 = parse_date(d2_str)
-    return (d1 - d2).days
-
-
 # -----------------------
 # Attribute helpers
 # -----------------------
 
+# translation table that removes punctuation, built once
+_PUNCT_TABLE = str.maketrans("", "", string.punctuation)
+
+
 def temperament_to_attributes(text):
     """
     Convert temperament/group_behavior string into array of words.
@@ -64,16 +68,8 @@ def temperament_to_attributes(text):
     if not text:
         return []
 
-    # lower case for case-insensitive matching
-    text = text.lower()
-
-    # remove punctuation
-    translator = str.maketrans("", "", string.punctuation)
-    text = text.translate(translator)
-
-    # split into words, drop empty
-    words = [w for w in text.split() if w]
-    return words
+    # split() with no argument already drops empty words
+    return text.lower().translate(_PUNCT_TABLE).split()
 
 
 # -----------------------
@@ -90,8 +86,17 @@ def register_pet_type(pet_type_obj):
     Store a new pet-type JSON object.
     pet_type_obj must already contain 'id' and 'type' and other fields.
     """
-    pet_types[pet_type_obj["id"]] = pet_type_obj
+    # fill the side tables first, so a pet-type visible in pet_types
+    # always has them (requests run on several threads)
+    pet_type_lower[pet_type_obj["id"]] = {
+        "id": str(pet_type_obj["id"]).lower(),
+        "type": str(pet_type_obj["type"]).lower(),
+        "family": str(pet_type_obj["family"]).lower(),
+        "genus": str(pet_type_obj["genus"]).lower(),
+        "attributes_lower": frozenset(a.lower() for a in pet_type_obj["attributes"]),
+    }
     pets_by_type[pet_type_obj["id"]] = {}
+    pet_types[pet_type_obj["id"]] = pet_type_obj
     type_name_to_id[pet_type_obj["type"].lower()] = pet_type_obj["id"]
 
 
@@ -103,6 +108,7 @@ def remove_pet_type(pet_type_id):
 
     pets_by_type.pop(pet_type_id, None)
     type_name_to_id.pop(pet_type["type"].lower(), None)
+    pet_type_lower.pop(pet_type_id, None)
 
 
 # -----------------------
@@ -113,31 +119,29 @@ def get_pets_for_type(pet_type_id):
     return pets_by_type.get(pet_type_id, {})
 
 
+def lookup_pet(pet_type_id, pet_name):
+    """Return the internal pet with this name (case-insensitive), or None."""
+    return pets_by_type.get(pet_type_id, {}).get(pet_name.lower())
+
+
 def add_pet(pet_type_id, internal_pet):
     """
-    Add pet to pets_by_type and to pet_types[...]['pets'] list.
-    internal_pet is dict with name, birthdate, picture, picture_url.
+    Add (or replace) pet in pets_by_type.
+    internal_pet is dict with name, birthdate, birthdate_parsed, picture, picture_url.
     """
-    pets = pets_by_type.setdefault(pet_type_id, {})
-    name_lower = internal_pet["name"].lower()
-    pets[name_lower] = internal_pet
-
-    pet_type = pet_types[pet_type_id]
-    if internal_pet["name"] not in pet_type["pets"]:
-        pet_type["pets"].append(internal_pet["name"])
+    pets_by_type.setdefault(pet_type_id, {})[internal_pet["name"].lower()] = internal_pet
 
 
 def delete_pet(pet_type_id, pet_name):
-    pets = pets_by_type.get(pet_type_id, {})
-    name_lower = pet_name.lower()
-    pet = pets.pop(name_lower, None)
-    if pet is None:
-        return None
+    """Remove pet from pets_by_type; return it, or None if it did not exist."""
+    return pets_by_type.get(pet_type_id, {}).pop(pet_name.lower(), None)
 
-    # remove from pet-types "pets" array
-    pet_type = pet_types[pet_type_id]
-    pet_type["pets"] = [n for n in pet_type["pets"] if n.lower() != name_lower]
-    return pet
+
+def pet_type_to_json(pet_type):
+    """Pet-type JSON with its "pets" array of names built from pets_by_type."""
+    # snapshot first: other request threads may add/delete pets meanwhile
+    pets = list(pets_by_type.get(pet_type["id"], {}).values())
+    return {**pet_type, "pets": [p["name"] for p in pets]}
 
 
 def pet_to_json(internal_pet):
@@ -149,6 +153,19 @@ def pet_to_json(internal_pet):
     }
 
 
+def picture_in_use(file_name, ignore=None):
+    """
+    True if any pet other than `ignore` still references this picture file.
+    Pets with the same picture-url share one file, so check before deleting.
+    """
+    # snapshot: other request threads may add/delete pets meanwhile
+    for pets in list(pets_by_type.values()):
+        for pet in list(pets.values()):
+            if pet is not ignore and pet["picture"] == file_name:
+                return True
+    return False
+
+
 def ensure_pictures_folder():
     if not os.path.exists("pictures"):
         os.makedirs("pictures")
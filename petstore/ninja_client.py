@@ -2,12 +2,28 @@
 import os
 import re
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from models import temperament_to_attributes
 
 # IMPORTANT: this must match the working curl URL
 NINJA_URL = "https://api.api-ninjas.com/v1/animals"
 
+# numbers inside the lifespan string, e.g. "10 - 12 years"
+_LIFESPAN_RE = re.compile(r"\d+")
+
+# shared session so repeated calls reuse keep-alive connections
+session = requests.Session()
+adapter = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=32,
+    max_retries=Retry(total=2, backoff_factor=0.1),
+)
+session.mount("http://", adapter)
+session.mount("https://", adapter)
+session.headers["Connection"] = "keep-alive"
+
 
 class NinjaApiError(Exception):
     """Unexpected response from Ninja API (for 5xx etc.)."""
@@ -82,7 +98,7 @@ def fetch_pet_type_data(type_name):
     params = {"name": type_name}
     headers = {"X-Api-Key": api_key}
 
-    resp = requests.get(NINJA_URL, params=params, headers=headers)
+    resp = session.get(NINJA_URL, params=params, headers=headers)
 
     # helpful debug line (you'll see this in the Flask terminal)
     print("Ninja status:", resp.status_code, "URL:", resp.url, flush=True)
@@ -98,11 +114,8 @@ def fetch_pet_type_data(type_name):
     data = resp.json()  # expected to be a list of entries
 
     # choose the entry whose name matches exactly, ignoring case
-    chosen = None
-    for entry in data:
-        if entry.get("name", "").lower() == type_name.lower():
-            chosen = entry
-            break
+    needle = (type_name or "").lower()
+    chosen = next((e for e in data if e.get("name", "").lower() == needle), None)
 
     if not chosen:
         raise NinjaNotFound()
@@ -130,7 +143,7 @@ def fetch_pet_type_data(type_name):
     lifespan_raw = characteristics.get("lifespan")
     lifespan_int = None
     if isinstance(lifespan_raw, str):
-        nums = re.findall(r"\d+", lifespan_raw)
+        nums = _LIFESPAN_RE.findall(lifespan_raw)
         if nums:
             lifespan_int = min(int(n) for n in nums)
 
@@ -1,23 +1,31 @@
 import json
 import subprocess
 import time
+from concurrent.futures import ThreadPoolExecutor, wait as wait_all
 from pathlib import Path
 import requests
+from requests.adapters import HTTPAdapter
 
 BASE1="http://localhost:5001"
 BASE2="http://localhost:5002"
 ORDER="http://localhost:5003"
 
+session=requests.Session()
+session.mount("http://", HTTPAdapter(pool_maxsize=16))
+
 def sh(cmd):
     subprocess.run(cmd, shell=True, check=True)
 
 def wait(url):
-    for _ in range(50):
+    # poll with a cheap HEAD, backing off from 50ms up to 1s (~25s total)
+    delay=0.05
+    for _ in range(30):
         try:
-            requests.get(url)
+            session.head(url, timeout=0.2)
             return
-        except:
-            time.sleep(0.5)
+        except requests.RequestException:
+            time.sleep(delay)
+            delay=min(delay*1.5, 1.0)
     raise RuntimeError("timeout")
 
 def main():
@@ -37,14 +45,23 @@ def main():
     if not q.exists():
         raise RuntimeError("query.txt missing")
 
-    out=[]
+    urls=[]
     for line in q.read_text().splitlines():
         if line.startswith("query:"):
             rest=line.split("query:",1)[1].strip().rstrip(";")
             store,qs=rest.split(",",1)
             base=BASE1 if store=="1" else BASE2
-            r=requests.get(base+"/pet-types?"+qs)
-            out+= [str(r.status_code), json.dumps(r.json(),indent=2), ";"]
+            urls.append(base+"/pet-types?"+qs)
+
+    # fire the queries concurrently; futures stay in file order
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures=[pool.submit(session.get, url) for url in urls]
+        wait_all(futures)
+
+    out=[]
+    for f in futures:
+        r=f.result()
+        out+= [str(r.status_code), json.dumps(r.json(),indent=2), ";"]
     Path("response.txt").write_text("\n".join(out))
 
 if __name__=="__main__":